@@ -1,178 +1,230 @@
 # chart_generator.py
+import hashlib
+import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from typing import List, Optional
+from typing import Optional, Sequence, Tuple
+from database_manager import PRIORITY_LEVELS, priority_codes
 
+try:
+    from plotly_resampler import FigureResampler
+except ImportError:  # plotly-resampler is optional; long traces are then sent in full
+    FigureResampler = None
 
-class ChartGenerator:
-    """Generates various charts and visualizations"""
-    
-    def __init__(self, time_periods: List[str]):
-        self.time_periods = time_periods
-    
-    def create_power_consumption_chart(self, plot_df: pd.DataFrame) -> go.Figure:
-        """Create power consumption over time chart"""
-        fig = px.line(plot_df, x=plot_df.index, y="Total Load (W)", markers=True)
-        fig.update_layout(
-            xaxis_title="Time Period",
-            yaxis_title="Power Consumption (W)",
-            title="Power Consumption (W) Over Time",
-            height=400
-        )
-        return fig
-    
-    def create_stacked_energy_chart(self, energy_df: pd.DataFrame) -> go.Figure:
-        """Create stacked bar chart for energy by appliance"""
-        stacked_fig = go.Figure()
-        for appliance in energy_df["Appliance"]:
-            stacked_fig.add_trace(go.Bar(
-                name=appliance,
-                x=self.time_periods,
-                y=energy_df[energy_df["Appliance"] == appliance][self.time_periods].values[0]
-            ))
-        stacked_fig.update_layout(
-            barmode='stack',
-            xaxis_title="Time",
-            yaxis_title="Wh Consumed",
-            title="Energy Consumption by Appliance per Time Period (Including Use Time %)",
-            height=450
-        )
-        return stacked_fig
-    
-    def create_daily_energy_bar_chart(self, df: pd.DataFrame) -> Optional[go.Figure]:
-        """Create bar chart for daily energy consumption by appliance"""
-        appliance_daily_energy = []
-        appliance_names = []
-        appliance_priorities = []
-
-        for appliance in df["Appliance"]:
-            daily_energy = df.loc[df["Appliance"] == appliance, "Total Daily Energy (Wh)"].values[0]
-            if daily_energy > 0:
-                appliance_names.append(appliance)
-                appliance_daily_energy.append(daily_energy)
-                priority = df.loc[df["Appliance"] == appliance, "Priority"].values[0]
-                appliance_priorities.append(priority.lower())
-
-        if not appliance_daily_energy:
-            return None
+# Line charts whose longest trace exceeds this many points are decimated by plotly-resampler
+RESAMPLE_THRESHOLD = 1000
 
-        # Build per-priority series
-        y_essential = [e if p == "essential" else 0 for e, p in zip(appliance_daily_energy, appliance_priorities)]
-        y_medium = [e if p == "medium" else 0 for e, p in zip(appliance_daily_energy, appliance_priorities)]
-        y_non_ess = [e if (p not in ["essential", "medium"]) else 0 for e, p in zip(appliance_daily_energy, appliance_priorities)]
 
-        text_vals = [f"{e:.0f}" for e in appliance_daily_energy]
-        text_ess = [t if p == "essential" else "" for t, p in zip(text_vals, appliance_priorities)]
-        text_med = [t if p == "medium" else "" for t, p in zip(text_vals, appliance_priorities)]
-        text_non = [t if (p not in ["essential", "medium"]) else "" for t, p in zip(text_vals, appliance_priorities)]
+def frame_digest(df: pd.DataFrame) -> str:
+    """Fast content hash of a DataFrame (values, index and column labels)"""
+    digest = hashlib.blake2b(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes(), digest_size=16)
+    digest.update("\x1f".join(map(str, df.columns)).encode())
+    return digest.hexdigest()
 
-        fig_bar = go.Figure()
 
-        fig_bar.add_trace(go.Bar(
-            name="Essential",
-            x=appliance_names, y=y_essential,
-            marker_color="#FF6B6B",
-            text=text_ess, textposition="outside",
-            hovertemplate="<b>%{x}</b><br>Daily Energy: %{y:.0f} Wh<br>Daily Energy: %{customdata:.2f} kWh<br><extra></extra>",
-            customdata=[e/1000 if p == "essential" else 0 for e, p in zip(appliance_daily_energy, appliance_priorities)],
-            showlegend=True
+def _decimate(fig: go.Figure) -> go.Figure:
+    """Wrap a line chart in a FigureResampler when a trace outgrows RESAMPLE_THRESHOLD"""
+    if FigureResampler is None:
+        return fig
+    longest = max((len(trace.y) for trace in fig.data if trace.y is not None), default=0)
+    if longest <= RESAMPLE_THRESHOLD:
+        return fig
+    return FigureResampler(fig, default_n_shown_samples=RESAMPLE_THRESHOLD)
+
+
+# Chart builders are pure functions of their inputs, so reruns with unchanged data reuse the figure;
+# each builder keeps only the last few edits so the cache cannot grow with every keystroke
+_cache_chart = st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: frame_digest})
+
+
+@_cache_chart
+def _build_power_consumption_chart(plot_df: pd.DataFrame) -> go.Figure:
+    """Create power consumption over time chart"""
+    fig = px.line(plot_df, x=plot_df.index, y="Total Load (W)", markers=True, render_mode="webgl")
+    fig.update_layout(
+        xaxis_title="Time Period",
+        yaxis_title="Power Consumption (W)",
+        title="Power Consumption (W) Over Time",
+        height=400
+    )
+    return fig
+
+
+@_cache_chart
+def _build_stacked_energy_chart(energy_df: pd.DataFrame, time_periods: Tuple[str, ...]) -> go.Figure:
+    """Create stacked bar chart for energy by priority class"""
+    time_periods = list(time_periods)
+    # Unknown priorities count as non-essential
+    codes = priority_codes(energy_df["Priority"])
+    codes = np.where(codes < 0, PRIORITY_LEVELS.index("non-essential"), codes)
+    tier_energy = (energy_df[time_periods].groupby(codes).sum()
+                   .reindex(range(len(PRIORITY_LEVELS)), fill_value=0).to_numpy(dtype=float))
+    tier_counts = np.bincount(codes, minlength=len(PRIORITY_LEVELS))
+
+    # One trace per priority class rather than per appliance keeps the figure light
+    stacked_fig = go.Figure()
+    for code, (name, color) in enumerate((("Essential", "#FF6B6B"),
+                                          ("Medium", "#FFD93D"),
+                                          ("Non-Essential", "#45B7D1"))):
+        stacked_fig.add_trace(go.Bar(
+            name=name,
+            x=time_periods,
+            y=tier_energy[code],
+            marker_color=color,
+            customdata=np.full(len(time_periods), tier_counts[code]),
+            hovertemplate=f"<b>{name}</b> (%{{customdata}} appliances)<br>" +
+                          "Time: %{x}<br>Energy: %{y:.0f} Wh<extra></extra>"
         ))
-
+    stacked_fig.update_layout(
+        barmode='stack',
+        xaxis_title="Time",
+        yaxis_title="Wh Consumed",
+        title="Energy Consumption by Priority per Time Period (Including Use Time %)",
+        height=450
+    )
+    return stacked_fig
+
+
+@_cache_chart
+def _build_daily_energy_bar_chart(df: pd.DataFrame) -> Optional[go.Figure]:
+    """Create bar chart for daily energy consumption by appliance"""
+    consuming = df[df["Total Daily Energy (Wh)"] > 0]
+    if consuming.empty:
+        return None
+
+    appliance_names = consuming["Appliance"].to_numpy()
+    daily_energy = consuming["Total Daily Energy (Wh)"].to_numpy(dtype=float)
+    codes = priority_codes(consuming["Priority"])
+
+    # Build per-priority series from boolean masks
+    is_essential = codes == PRIORITY_LEVELS.index("essential")
+    is_medium = codes == PRIORITY_LEVELS.index("medium")
+    is_non_essential = ~(is_essential | is_medium)
+    text_vals = np.char.mod("%.0f", daily_energy)
+
+    fig_bar = go.Figure()
+
+    for name, color, mask in (("Essential", "#FF6B6B", is_essential),
+                              ("Medium", "#FFD93D", is_medium),
+                              ("Non-Essential", "#45B7D1", is_non_essential)):
         fig_bar.add_trace(go.Bar(
-            name="Medium",
-            x=appliance_names, y=y_medium,
-            marker_color="#FFD93D",
-            text=text_med, textposition="outside",
+            name=name,
+            x=appliance_names, y=np.where(mask, daily_energy, 0),
+            marker_color=color,
+            text=np.where(mask, text_vals, ""), textposition="outside",
             hovertemplate="<b>%{x}</b><br>Daily Energy: %{y:.0f} Wh<br>Daily Energy: %{customdata:.2f} kWh<br><extra></extra>",
-            customdata=[e/1000 if p == "medium" else 0 for e, p in zip(appliance_daily_energy, appliance_priorities)],
+            customdata=np.where(mask, daily_energy / 1000, 0),
             showlegend=True
         ))
 
-        fig_bar.add_trace(go.Bar(
-            name="Non-Essential",
-            x=appliance_names, y=y_non_ess,
-            marker_color="#45B7D1",
-            text=text_non, textposition="outside",
-            hovertemplate="<b>%{x}</b><br>Daily Energy: %{y:.0f} Wh<br>Daily Energy: %{customdata:.2f} kWh<br><extra></extra>",
-            customdata=[e/1000 if p not in ["essential", "medium"] else 0 for e, p in zip(appliance_daily_energy, appliance_priorities)],
-            showlegend=True
-        ))
+    fig_bar.update_layout(
+        title="Daily Energy Consumption by Appliance (Including Use Time %)",
+        xaxis_title="Appliances",
+        yaxis_title="Daily Energy Consumption (Wh)",
+        height=600,
+        xaxis_tickangle=-60,
+        margin=dict(b=200),
+        yaxis=dict(gridcolor="lightgray"),
+        barmode="stack",
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
+    )
+
+    return fig_bar
+
+
+@_cache_chart
+def _build_time_series_chart(power_df: pd.DataFrame, title: str, time_periods: Tuple[str, ...]) -> go.Figure:
+    """Create time series chart for individual appliances"""
+    time_periods = list(time_periods)
+    fig_timeseries = go.Figure()
+    colors = px.colors.qualitative.Set3 + px.colors.qualitative.Pastel + px.colors.qualitative.Set1
+
+    power_matrix = power_df[time_periods].to_numpy()
+    for i, (appliance, appliance_data) in enumerate(zip(power_df["Appliance"].to_numpy(), power_matrix)):
+        if appliance_data.max() > 0:
+            fig_timeseries.add_trace(go.Scattergl(
+                x=time_periods,
+                y=appliance_data,
+                mode='lines+markers',
+                name=appliance,
+                line=dict(color=colors[i % len(colors)], width=2),
+                marker=dict(size=6),
+                hovertemplate=f'<b>{appliance}</b><br>' +
+                             'Time: %{x}<br>' +
+                             'Avg Power: %{y:.1f} W<br>' +
+                             '<extra></extra>'
+            ))
 
-        fig_bar.update_layout(
-            title="Daily Energy Consumption by Appliance (Including Use Time %)",
-            xaxis_title="Appliances",
-            yaxis_title="Daily Energy Consumption (Wh)",
-            height=600,
-            xaxis_tickangle=-60,
-            margin=dict(b=200),
-            yaxis=dict(gridcolor="lightgray"),
-            barmode="stack",
-            showlegend=True,
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
-        )
-
-        return fig_bar
+    fig_timeseries.update_layout(
+        title=title,
+        xaxis_title="Time Period",
+        yaxis_title="Power Consumption (W)",
+        height=600,
+        hovermode='x',
+        legend=dict(orientation="v", yanchor="top", y=1, xanchor="left", x=1.02),
+        margin=dict(r=200)
+    )
+    fig_timeseries.update_xaxes(showgrid=False)
+    fig_timeseries.update_yaxes(showgrid=False)
+    return fig_timeseries
+
+
+@_cache_chart
+def _build_comparison_chart(comparison_df: pd.DataFrame) -> go.Figure:
+    """Create aggregated load profiles comparison chart"""
+    fig_comparison = go.Figure()
+
+    fig_comparison.add_trace(go.Scattergl(
+        x=comparison_df["Time Period"], y=comparison_df["All Appliances (Off-Grid)"],
+        mode="lines+markers", name="All Appliances (Off-Grid)"
+    ))
+
+    fig_comparison.add_trace(go.Scattergl(
+        x=comparison_df["Time Period"], y=comparison_df["Essential + Medium (No Heating)"],
+        mode="lines+markers", name="Essential + Medium (No Heating)"
+    ))
+
+    fig_comparison.add_trace(go.Scattergl(
+        x=comparison_df["Time Period"], y=comparison_df["Essentials Only"],
+        mode="lines+markers", name="Essentials Only"
+    ))
+
+    fig_comparison.update_layout(
+        title="Aggregated Load Profiles by Category",
+        xaxis_title="Time Period",
+        yaxis_title="Power Consumption (W)",
+        hovermode="x unified",
+        height=500
+    )
+
+    return fig_comparison
+
+
+class ChartGenerator:
+    """Generates various charts and visualizations"""
+    
+    def __init__(self, time_periods: Sequence[str]):
+        self.time_periods = list(time_periods)
+    
+    def create_power_consumption_chart(self, plot_df: pd.DataFrame) -> go.Figure:
+        """Create power consumption over time chart"""
+        return _decimate(_build_power_consumption_chart(plot_df))
+    
+    def create_stacked_energy_chart(self, energy_df: pd.DataFrame) -> go.Figure:
+        """Create stacked bar chart for energy by priority class"""
+        return _build_stacked_energy_chart(energy_df, tuple(self.time_periods))
+    
+    def create_daily_energy_bar_chart(self, df: pd.DataFrame) -> Optional[go.Figure]:
+        """Create bar chart for daily energy consumption by appliance"""
+        return _build_daily_energy_bar_chart(df)
     
     def create_time_series_chart(self, power_df: pd.DataFrame, title: str = "Power Consumption Time Series") -> go.Figure:
         """Create time series chart for individual appliances"""
-        fig_timeseries = go.Figure()
-        colors = px.colors.qualitative.Set3 + px.colors.qualitative.Pastel + px.colors.qualitative.Set1
-
-        for i, appliance in enumerate(power_df["Appliance"]):
-            appliance_data = power_df[power_df["Appliance"] == appliance][self.time_periods].values[0]
-            if max(appliance_data) > 0:
-                fig_timeseries.add_trace(go.Scatter(
-                    x=self.time_periods,
-                    y=appliance_data,
-                    mode='lines+markers',
-                    name=appliance,
-                    line=dict(color=colors[i % len(colors)], width=2),
-                    marker=dict(size=6),
-                    hovertemplate=f'<b>{appliance}</b><br>' +
-                                 'Time: %{x}<br>' +
-                                 'Avg Power: %{y:.1f} W<br>' +
-                                 '<extra></extra>'
-                ))
-
-        fig_timeseries.update_layout(
-            title=title,
-            xaxis_title="Time Period",
-            yaxis_title="Power Consumption (W)",
-            height=600,
-            hovermode='x unified',
-            legend=dict(orientation="v", yanchor="top", y=1, xanchor="left", x=1.02),
-            margin=dict(r=200)
-        )
-        fig_timeseries.update_xaxes(showgrid=False)
-        fig_timeseries.update_yaxes(showgrid=False)
-        return fig_timeseries
+        return _decimate(_build_time_series_chart(power_df, title, tuple(self.time_periods)))
     
     def create_comparison_chart(self, comparison_df: pd.DataFrame) -> go.Figure:
         """Create aggregated load profiles comparison chart"""
-        fig_comparison = go.Figure()
-
-        fig_comparison.add_trace(go.Scatter(
-            x=comparison_df["Time Period"], y=comparison_df["All Appliances (Off-Grid)"],
-            mode="lines+markers", name="All Appliances (Off-Grid)"
-        ))
-
-        fig_comparison.add_trace(go.Scatter(
-            x=comparison_df["Time Period"], y=comparison_df["Essential + Medium (No Heating)"],
-            mode="lines+markers", name="Essential + Medium (No Heating)"
-        ))
-
-        fig_comparison.add_trace(go.Scatter(
-            x=comparison_df["Time Period"], y=comparison_df["Essentials Only"],
-            mode="lines+markers", name="Essentials Only"
-        ))
-
-        fig_comparison.update_layout(
-            title="Aggregated Load Profiles by Category",
-            xaxis_title="Time Period",
-            yaxis_title="Power Consumption (W)",
-            hovermode="x unified",
-            height=500
-        )
-
-        return fig_comparison
\ No newline at end of file
+        return _decimate(_build_comparison_chart(comparison_df))
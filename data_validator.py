@@ -1,17 +1,39 @@
 # data_validator.py
+import numpy as np
 import pandas as pd
+from typing import Sequence
+
+
+# Acceptable (min, max) range per column; None leaves that side unbounded
+CLIP_BOUNDS = {
+    "Use Time (%)": (0, 100),
+    "Power (W)": (0, None),
+    "Duty Cycle (%)": (0, 100),
+    "Power Factor": (0.01, 1.0),
+    "Quantity": (0, None),
+}
 
 
 class DataValidator:
     """Validates and cleans appliance data"""
     
     @staticmethod
-    def validate_df(df: pd.DataFrame) -> pd.DataFrame:
-        """Validate and clip dataframe values to acceptable ranges"""
-        df = df.copy()
-        df["Use Time (%)"] = df["Use Time (%)"].clip(0, 100)
-        df["Power (W)"] = df["Power (W)"].clip(0)
-        df["Duty Cycle (%)"] = df["Duty Cycle (%)"].clip(0, 100)
-        df["Power Factor"] = df["Power Factor"].clip(0.01, 1.0)
-        df["Quantity"] = df["Quantity"].clip(0)
+    def validate_df(df: pd.DataFrame, time_periods: Sequence[str] = ()) -> pd.DataFrame:
+        """Validate and clip dataframe values to acceptable ranges, storing time slots as int8 flags"""
+        # Shallow copy: every clipped column is replaced by a fresh array below
+        df = df.copy(deep=False)
+        for col, (lo, hi) in CLIP_BOUNDS.items():
+            column = df[col]
+            if not pd.api.types.is_numeric_dtype(column):
+                # Blank cells in rows added in the editor arrive as None in an object column
+                column = pd.to_numeric(column, errors="coerce")
+            if column.hasnans:
+                values = column.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+            else:
+                values = column.to_numpy(copy=True)
+            np.clip(values, lo, hi, out=values)
+            df[col] = values
+        # Rows added in the editor leave unticked slots empty
+        for col in time_periods:
+            df[col] = df[col].fillna(0).to_numpy(dtype=np.int8)
         return df
\ No newline at end of file
@@ -1,20 +1,138 @@
 # database_manager.py
 import streamlit as st
+import numpy as np
 import pandas as pd
 import sqlite3
+import atexit
+import functools
+import threading
 from datetime import datetime
 import os
 import sys
-from typing import List, Optional
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from default_data_provider import DefaultDataProvider
 
+# 12×2h intervals with wrap to midnight (last ends 00:00), shared by every manager
+TIME_PERIODS: Tuple[str, ...] = tuple(f"{i:02d}:00–{(i + 2) % 24:02d}:00" for i in range(0, 24, 2))
+
+# Persisted appliance columns, in table order (time slots packed into schedule_mask)
+APPLIANCE_COLUMNS: Tuple[str, ...] = (
+    "id", "Appliance", "Quantity", "Power (W)", "Duty Cycle (%)", "Power Factor", "Use Time (%)",
+    "schedule_mask", "Priority", "Room", "Apparent Power (VA)", "Total Daily Energy (Wh)"
+)
+
+# Canonical priority classes, in category-code order
+PRIORITY_LEVELS = ("essential", "medium", "non-essential")
+
+APPLIANCES_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS appliances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Appliance TEXT,
+    Quantity INTEGER,
+    "Power (W)" REAL,
+    "Duty Cycle (%)" REAL,
+    "Power Factor" REAL,
+    "Use Time (%)" REAL,
+    schedule_mask INTEGER,
+    Priority TEXT,
+    Room TEXT,
+    "Apparent Power (VA)" REAL,
+    "Total Daily Energy (Wh)" REAL
+)
+'''
+
+INDEXES_SQL = '''
+CREATE INDEX IF NOT EXISTS idx_app_name ON appliances(Appliance);
+CREATE INDEX IF NOT EXISTS idx_log_time ON change_log(timestamp);
+'''
+
+
+def priority_codes(priority: pd.Series) -> np.ndarray:
+    """Category codes of a Priority column into PRIORITY_LEVELS (-1 for unknown values)"""
+    if not isinstance(priority.dtype, pd.CategoricalDtype):
+        priority = priority.str.strip().str.lower()
+    return pd.Categorical(priority, categories=PRIORITY_LEVELS).codes
+
+
+def _row_hashes(df: pd.DataFrame) -> pd.Series:
+    """One uint64 hash per row; numerics hash as float64 so dtype changes alone don't count as edits"""
+    combined = np.zeros(len(df), dtype=np.uint64)
+    for col in sorted(df.columns):
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            values = np.where(np.isnan(values), np.nan, values)  # one NaN bit pattern
+        else:
+            values = series.to_numpy(dtype=object)
+        combined = combined * np.uint64(1000003) ^ pd.util.hash_array(values)
+    return pd.Series(combined, index=df.index)
+
+
+@functools.lru_cache(maxsize=8)
+def _select_sql(columns: Tuple[str, ...]) -> str:
+    """Build the appliance SELECT with an explicit column list (NULL masks/quantities read as 0)"""
+    selected = []
+    for col in columns:
+        if col in ("Quantity", "schedule_mask"):
+            selected.append(f'COALESCE("{col}", 0) AS "{col}"')
+        else:
+            selected.append(f'"{col}"')
+    return f"SELECT {', '.join(selected)} FROM appliances"
+
+
+@st.cache_resource
+def _open_connection(db_file: str, read_only: bool = False) -> sqlite3.Connection:
+    """Open one long-lived connection per database file, shared across reruns"""
+    if read_only:
+        conn = sqlite3.connect(f"{Path(db_file).as_uri()}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(db_file, check_same_thread=False)
+        # WAL journal: commits append to the log instead of rewriting the rollback journal
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    # Memory-map up to 256 MiB of the file and keep ~20 MB of pages cached
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-20000")
+    atexit.register(conn.close)
+    return conn
+
+
+@st.cache_resource
+def _write_lock(db_file: str) -> threading.Lock:
+    """Serialize writes on the connection that _open_connection shares across sessions"""
+    return threading.Lock()
+
 
 class DatabaseManager:
     """Handles all database operations"""
     
     def __init__(self):
         self.db_file = self._get_db_path()
-        self.time_periods = self._make_time_periods()
+        self.time_periods = TIME_PERIODS
+        self.columns = APPLIANCE_COLUMNS
+        self.select_sql = _select_sql(APPLIANCE_COLUMNS)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._read_conn: Optional[sqlite3.Connection] = None
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Shared SQLite connection, opened on first use"""
+        if self._conn is None:
+            self._conn = _open_connection(self.db_file)
+        return self._conn
+    
+    @property
+    def read_conn(self) -> sqlite3.Connection:
+        """Shared read-only SQLite connection for loads, opened on first use"""
+        if self._read_conn is None:
+            self._read_conn = _open_connection(self.db_file, read_only=True)
+        return self._read_conn
+    
+    @property
+    def write_lock(self) -> threading.Lock:
+        """Lock held around every write so concurrent sessions never interleave transactions"""
+        return _write_lock(self.db_file)
         
     def _get_db_path(self) -> str:
         """Determine database file path"""
@@ -23,146 +141,221 @@ class DatabaseManager:
         else:
             return os.path.join(os.path.expanduser("~"), "load_profile.db")
     
-    def _make_time_periods(self) -> List[str]:
-        """Build 12×2h intervals with wrap to midnight (last ends 00:00)"""
-        periods = []
-        for i in range(0, 24, 2):
-            start = f"{i:02d}:00"
-            end = f"{(i + 2) % 24:02d}:00"  # 22:00–00:00
-            periods.append(f"{start}–{end}")
-        return periods
+    def _column_dtypes(self) -> Dict[str, str]:
+        """Explicit dtypes for loaded appliance columns, so pandas skips inference"""
+        dtypes = {
+            "id": "int64",
+            "Quantity": "int32",
+            "Power (W)": "float32",
+            "Duty Cycle (%)": "float32",
+            "Power Factor": "float32",
+            "Use Time (%)": "float32",
+            "Apparent Power (VA)": "float32",
+            "Total Daily Energy (Wh)": "float32",
+            "schedule_mask": "uint16",
+        }
+        return dtypes
+    
+    def _pack_schedule(self, df: pd.DataFrame) -> np.ndarray:
+        """Pack the time-slot flags into one integer per row (bit i = time period i)"""
+        on = df[list(self.time_periods)].fillna(0).to_numpy(dtype=bool)
+        return on.astype(np.int64) @ (1 << np.arange(len(self.time_periods), dtype=np.int64))
+    
+    def _unpack_schedule(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Replace schedule_mask with one int8 column per time period"""
+        masks = df["schedule_mask"].to_numpy(dtype="<u2")
+        bits = np.unpackbits(masks.view(np.uint8).reshape(-1, 2), axis=1, bitorder="little")
+        schedule = pd.DataFrame(bits[:, :len(self.time_periods)].astype(np.int8),
+                                index=df.index, columns=list(self.time_periods))
+        at = df.columns.get_loc("schedule_mask")
+        return pd.concat([df.iloc[:, :at], schedule, df.iloc[:, at + 1:]], axis=1)
+    
+    @staticmethod
+    def _insert_sql(columns: Tuple[str, ...], verb: str = "INSERT") -> str:
+        """Build a parametrized INSERT statement for the appliances table"""
+        quoted = ", ".join(f'"{col}"' for col in columns)
+        placeholders = ", ".join("?" * len(columns))
+        return f"{verb} INTO appliances ({quoted}) VALUES ({placeholders})"
+    
+    def _write_rows(self, c: sqlite3.Cursor, df: pd.DataFrame) -> None:
+        """Upsert rows that carry an id; insert the rest so SQLite assigns one"""
+        df = df.assign(schedule_mask=self._pack_schedule(df))
+        has_id = df["id"].notna().to_numpy()
+        cols = list(self.columns)
+        c.executemany(self._insert_sql(self.columns, "INSERT OR REPLACE"),
+                      df.loc[has_id, cols].itertuples(index=False, name=None))
+        c.executemany(self._insert_sql(self.columns[1:]),
+                      df.loc[~has_id, cols[1:]].itertuples(index=False, name=None))
     
     def init_db(self) -> None:
         """Initialize database with required tables"""
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-
-        # Create appliances table with Use Time % column
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS appliances (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Appliance TEXT,
-                Quantity INTEGER,
-                "Power (W)" REAL,
-                "Duty Cycle (%)" REAL,
-                "Power Factor" REAL,
-                "Use Time (%)" REAL,
-                "00:00–02:00" INTEGER,
-                "02:00–04:00" INTEGER,
-                "04:00–06:00" INTEGER,
-                "06:00–08:00" INTEGER,
-                "08:00–10:00" INTEGER,
-                "10:00–12:00" INTEGER,
-                "12:00–14:00" INTEGER,
-                "14:00–16:00" INTEGER,
-                "16:00–18:00" INTEGER,
-                "18:00–20:00" INTEGER,
-                "20:00–22:00" INTEGER,
-                "22:00–00:00" INTEGER,
-                Priority TEXT,
-                Room TEXT,
-                "Apparent Power (VA)" REAL,
-                "Total Daily Energy (Wh)" REAL
-            )
-        ''')
-
-        # Create change log table
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS change_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                change_type TEXT,
-                appliance_id INTEGER,
-                appliance_name TEXT,
-                change_details TEXT,
-                timestamp TEXT
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
+        with self.write_lock:
+            conn = self.conn
+            c = conn.cursor()
+
+            # Create appliances table with Use Time % column
+            c.execute(APPLIANCES_TABLE_SQL)
+
+            # Create change log table
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS change_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    change_type TEXT,
+                    appliance_id INTEGER,
+                    appliance_name TEXT,
+                    change_details TEXT,
+                    timestamp TEXT
+                )
+            ''')
+
+            c.executescript(INDEXES_SQL)
+            conn.commit()
     
     def migrate_time_columns(self) -> None:
         """Migrate old time column format if needed"""
         try:
-            conn = sqlite3.connect(self.db_file)
-            c = conn.cursor()
-            c.execute("PRAGMA table_info(appliances)")
-            cols = [row[1] for row in c.fetchall()]
+            with self.write_lock:
+                conn = self.conn
+                c = conn.cursor()
+                c.execute("PRAGMA table_info(appliances)")
+                cols = [row[1] for row in c.fetchall()]
 
-            if "22:00–24:00" in cols and "22:00–00:00" not in cols:
-                c.execute('ALTER TABLE appliances ADD COLUMN "22:00–00:00" INTEGER DEFAULT 0')
-                c.execute('UPDATE appliances SET "22:00–00:00" = "22:00–24:00"')
-                conn.commit()
-                try:
-                    c.execute('ALTER TABLE appliances DROP COLUMN "22:00–24:00"')
+                if "22:00–24:00" in cols and "22:00–00:00" not in cols:
+                    c.execute('ALTER TABLE appliances ADD COLUMN "22:00–00:00" INTEGER DEFAULT 0')
+                    c.execute('UPDATE appliances SET "22:00–00:00" = "22:00–24:00"')
                     conn.commit()
-                except Exception:
-                    pass  # Older SQLite versions don't support DROP COLUMN
-            conn.close()
+                    try:
+                        c.execute('ALTER TABLE appliances DROP COLUMN "22:00–24:00"')
+                        conn.commit()
+                    except Exception:
+                        pass  # Older SQLite versions don't support DROP COLUMN
         except Exception as e:
             st.warning(f"Time-column migration warning: {e}")
     
     def update_schema(self) -> None:
         """Update database schema if needed"""
         try:
-            conn = sqlite3.connect(self.db_file)
-            c = conn.cursor()
-            c.execute("PRAGMA table_info(appliances)")
-            columns = [row[1] for row in c.fetchall()]
-            if "Use Time (%)" not in columns:
-                c.execute('ALTER TABLE appliances ADD COLUMN "Use Time (%)" REAL DEFAULT 50')
-                conn.commit()
-            conn.close()
+            with self.write_lock:
+                conn = self.conn
+                c = conn.cursor()
+                c.execute("PRAGMA table_info(appliances)")
+                columns = [row[1] for row in c.fetchall()]
+                if "Use Time (%)" not in columns:
+                    c.execute('ALTER TABLE appliances ADD COLUMN "Use Time (%)" REAL DEFAULT 50')
+                    conn.commit()
+
+                # Rebuild tables written by DataFrame.to_sql (no primary key, which upserts rely on)
+                # or by older versions (one column per time slot instead of schedule_mask)
+                c.execute("PRAGMA table_info(appliances)")
+                table_info = c.fetchall()
+                columns = [row[1] for row in table_info]
+                has_primary_key = any(row[1] == "id" and row[5] for row in table_info)
+                if not has_primary_key or "schedule_mask" not in columns:
+                    kept = [f'"{col}"' for col in self.columns if col in columns]
+                    selected = list(kept)
+                    if "schedule_mask" not in columns:
+                        kept.append('"schedule_mask"')
+                        selected.append(" | ".join(
+                            f'((COALESCE("{t}", 0) <> 0) << {i})'
+                            for i, t in enumerate(self.time_periods) if t in columns
+                        ) or "0")
+                    with conn:
+                        c.execute("ALTER TABLE appliances RENAME TO appliances_legacy")
+                        c.execute(APPLIANCES_TABLE_SQL)
+                        c.execute(f"INSERT OR REPLACE INTO appliances ({', '.join(kept)}) "
+                                  f"SELECT {', '.join(selected)} FROM appliances_legacy")
+                        c.execute("DROP TABLE appliances_legacy")
+                    c.executescript(INDEXES_SQL)  # indexes went with the legacy table
         except Exception as e:
             st.error(f"Error updating database: {e}")
     
+    @staticmethod
+    def _priority_categorical(priority: pd.Series) -> pd.Categorical:
+        """Canonicalize stored priorities onto PRIORITY_LEVELS, keeping unrecognized labels verbatim"""
+        canonical = priority.str.strip().str.lower()
+        known = canonical.isin(PRIORITY_LEVELS) | canonical.isna()
+        priority = canonical.where(known, priority)
+        extra = sorted(priority[~known].unique())
+        return pd.Categorical(priority, categories=PRIORITY_LEVELS + tuple(extra))
+    
+    def _read_rows(self, conn: sqlite3.Connection, ids: Optional[List] = None) -> pd.DataFrame:
+        """Read appliance rows (all, or only the given ids) with explicit dtypes and unpacked time slots"""
+        sql, params = self.select_sql, ()
+        if ids is not None:
+            sql += f" WHERE id IN ({', '.join('?' * len(ids))})"
+            params = ids
+        df = pd.read_sql_query(sql, conn, params=params, dtype=self._column_dtypes())
+        df["Priority"] = self._priority_categorical(df["Priority"])
+        return self._unpack_schedule(df)
+    
     def load_data(self) -> pd.DataFrame:
         """Load data from database"""
         try:
-            conn = sqlite3.connect(self.db_file)
-            df = pd.read_sql_query("SELECT * FROM appliances", conn)
-            conn.close()
-            return df
+            return self._read_rows(self.read_conn)
         except Exception as e:
             st.error(f"Error loading data: {e}")
             return pd.DataFrame()
     
-    def save_data(self, new_df: pd.DataFrame, old_df: Optional[pd.DataFrame] = None) -> bool:
-        """Save data to database with change logging"""
+    def snapshot(self, df: pd.DataFrame) -> pd.Series:
+        """Per-row hashes of a loaded appliance table, indexed by id, for change detection in save_data"""
+        return _row_hashes(df.set_index('id'))
+    
+    def save_data(self, new_df: pd.DataFrame, snapshot: Optional[pd.Series] = None) -> bool:
+        """Save data to database with change logging against the row-hash snapshot of the saved table"""
         try:
-            conn = sqlite3.connect(self.db_file)
-            c = conn.cursor()
-
-            if old_df is not None:
-                old_df = old_df.set_index('id')
+            if snapshot is not None:
+                # Find deleted, changed and new rows from the row hashes alone
                 new_df_indexed = new_df.set_index('id')
+                new_hashes = _row_hashes(new_df_indexed)
+                deleted_ids = snapshot.index.difference(new_df_indexed.index).dropna().tolist()
+                common = new_df_indexed.index.intersection(snapshot.index).dropna()
+                changed_ids = common[new_hashes.loc[common].to_numpy() != snapshot.loc[common].to_numpy()]
+                is_new = ~new_df_indexed.index.isin(common)
+                if not deleted_ids and changed_ids.empty and not is_new.any():
+                    return True  # nothing to write
+
+            conn = self.conn
+            with self.write_lock, conn:  # single transaction for the log rows and row writes
+                c = conn.cursor()
+
+                if snapshot is not None:
+                    # Column-level details come from the saved rows, read back only for changed or deleted ids
+                    saved = self._read_rows(conn, changed_ids.tolist() + deleted_ids).set_index('id')
+                    timestamp = datetime.now().isoformat()
+                    log_rows: List[Tuple] = []
+
+                    for id_ in deleted_ids:
+                        appliance_name = saved['Appliance'].get(id_)
+                        log_rows.append(('DELETE', id_, appliance_name, f"Deleted appliance: {appliance_name}", timestamp))
+
+                    # NaN == NaN counts as unchanged; Priority is compared as labels since `saved`
+                    # only holds the categories of the rows read back
+                    new_changed = new_df_indexed.loc[changed_ids].astype({"Priority": object})
+                    old_changed = saved.reindex(index=changed_ids, columns=new_changed.columns).astype({"Priority": object})
+                    diff = new_changed.ne(old_changed) & ~(new_changed.isna() & old_changed.isna())
+                    changed_rows = diff.any(axis=1).to_numpy()
+                    for id_, row_diff in zip(changed_ids[changed_rows], diff.to_numpy()[changed_rows]):
+                        changes = {col: new_changed.at[id_, col] for col in new_changed.columns[row_diff]}
+                        log_rows.append(('UPDATE', id_, new_changed.at[id_, 'Appliance'], f"Updated: {changes}", timestamp))
+
+                    inserted = new_df_indexed.loc[is_new, 'Appliance']
+                    for id_, appliance_name in inserted.items():
+                        log_rows.append(('INSERT', id_, appliance_name, f"Added new appliance: {appliance_name}", timestamp))
 
-                deleted_ids = set(old_df.index) - set(new_df_indexed.index)
-                for id_ in deleted_ids:
-                    appliance_name = old_df.loc[id_, 'Appliance']
-                    c.execute(
+                    if deleted_ids:
+                        placeholders = ", ".join("?" * len(deleted_ids))
+                        c.execute(f"DELETE FROM appliances WHERE id IN ({placeholders})", deleted_ids)
+                    c.executemany(
                         "INSERT INTO change_log (change_type, appliance_id, appliance_name, change_details, timestamp) VALUES (?, ?, ?, ?, ?)",
-                        ('DELETE', id_, appliance_name, f"Deleted appliance: {appliance_name}", datetime.now().isoformat())
+                        log_rows
                     )
-                    c.execute("DELETE FROM appliances WHERE id = ?", (id_,))
-
-                for id_ in new_df_indexed.index:
-                    if id_ in old_df.index:
-                        if not new_df_indexed.loc[id_].equals(old_df.loc[id_]):
-                            changes = {col: new_df_indexed.loc[id_, col] for col in new_df_indexed.columns if new_df_indexed.loc[id_, col] != old_df.loc[id_, col]}
-                            c.execute(
-                                "INSERT INTO change_log (change_type, appliance_id, appliance_name, change_details, timestamp) VALUES (?, ?, ?, ?, ?)",
-                                ('UPDATE', id_, new_df_indexed.loc[id_, 'Appliance'], f"Updated: {changes}", datetime.now().isoformat())
-                            )
-                    else:
-                        c.execute(
-                            "INSERT INTO change_log (change_type, appliance_id, appliance_name, change_details, timestamp) VALUES (?, ?, ?, ?, ?)",
-                            ('INSERT', id_, new_df_indexed.loc[id_, 'Appliance'], f"Added new appliance: {new_df_indexed.loc[id_, 'Appliance']}", datetime.now().isoformat())
-                        )
-
-            new_df.to_sql('appliances', conn, if_exists='replace', index=True)
-            conn.commit()
-            conn.close()
+
+                    # Only rewrite rows that were updated or added
+                    written = new_df_indexed[is_new | new_df_indexed.index.isin(changed_ids[changed_rows])].reset_index()
+                else:
+                    written = new_df
+
+                self._write_rows(c, written)
             return True
         except Exception as e:
             st.error(f"Error saving data: {e}")
@@ -171,18 +364,14 @@ class DatabaseManager:
     def initialize_with_default_data(self) -> None:
         """Initialize database with default data if empty"""
         try:
-            conn = sqlite3.connect(self.db_file)
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) FROM appliances")
-            if c.fetchone()[0] == 0:
-                default_data = DefaultDataProvider().get_default_data()
-                df = pd.DataFrame(default_data, columns=[
-                    "Appliance", "Quantity", "Power (W)", "Duty Cycle (%)", "Power Factor", "Use Time (%)"
-                ] + self.time_periods + ["Priority", "Room"])
-                df["Apparent Power (VA)"] = (df["Power (W)"] / df["Power Factor"]).round(1)
-                df["Total Daily Energy (Wh)"] = 0
-                df.to_sql('appliances', conn, if_exists='replace', index=True, index_label='id')
-            conn.commit()
-            conn.close()
+            with self.write_lock:
+                conn = self.conn
+                c = conn.cursor()
+                c.execute("SELECT COUNT(*) FROM appliances")
+                if c.fetchone()[0] == 0:
+                    df = DefaultDataProvider.get_default_df(self.time_periods)
+                    df.insert(0, "id", None)
+                    self._write_rows(c, df)
+                conn.commit()
         except Exception as e:
             st.error(f"Error initializing database: {e}")
\ No newline at end of file
@@ -1,5 +1,7 @@
 # default_data_provider.py
-from typing import List
+import functools
+import pandas as pd
+from typing import List, Tuple
 
 
 class DefaultDataProvider:
@@ -47,4 +49,20 @@ class DefaultDataProvider:
             ["Electric Stove", 1, 2500, 80, 1.00, 25, False, False, False, False, False, False, True, True, False, False, False, False, "non-essential", "Kitchen"],
             ["Ceiling Light (Bathroom)", 2, 15, 50, 0.95, 30, False, False, False, True, True, False, False, False, True, True, False, False, "essential", "Bathroom"],
             ["Outdoor Light", 4, 20, 70, 0.95, 85, True, True, False, False, False, False, False, False, True, True, True, True, "essential", "Outdoor"],
-        ]
\ No newline at end of file
+        ]
+    
+    @staticmethod
+    def get_default_df(time_periods: Tuple[str, ...]) -> pd.DataFrame:
+        """Return default appliance data as a DataFrame with derived columns filled in"""
+        return _build_default_df(tuple(time_periods)).copy()
+
+
+@functools.lru_cache(maxsize=4)
+def _build_default_df(time_periods: Tuple[str, ...]) -> pd.DataFrame:
+    """Build the default appliance frame once per time-period layout"""
+    df = pd.DataFrame(DefaultDataProvider.get_default_data(), columns=[
+        "Appliance", "Quantity", "Power (W)", "Duty Cycle (%)", "Power Factor", "Use Time (%)"
+    ] + list(time_periods) + ["Priority", "Room"])
+    df["Apparent Power (VA)"] = pd.eval("df['Power (W)'] / df['Power Factor']")
+    df["Total Daily Energy (Wh)"] = 0
+    return df
\ No newline at end of file
@@ -1,16 +1,65 @@
 # energy_calculator.py
+import warnings
+import numpy as np
 import pandas as pd
-from typing import List, Tuple
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the batch methods fall back to NumPy
+    njit = None
+
+
+if njit is not None:
+    # Serial on purpose: Streamlit reruns scripts on worker threads, which numba's
+    # default parallel threading layer does not support. No fastmath either, so NaN inputs from blank
+    # editor rows come out as NaN exactly as in the NumPy fallback.
+    @njit(cache=True, nogil=True)
+    def _energy_kernel(qty, power, duty, use_time, schedule, out):
+        """Fill out[i, t] with the Wh drawn by appliance i in 2-hour period t"""
+        for i in range(qty.shape[0]):
+            scale = qty[i] * power[i] * duty[i] * use_time[i] * np.float32(2e-4)
+            for t in range(schedule.shape[1]):
+                out[i, t] = scale * schedule[i, t]
+
+    @njit(cache=True, nogil=True)
+    def _tier_kernel(schedule, weights, out):
+        """Fill out[k] with the peak over periods of the schedule-weighted sum of weights[:, k]"""
+        for k in range(weights.shape[1]):
+            peak = np.float32(0)
+            for t in range(schedule.shape[1]):
+                total = np.float32(0)
+                for i in range(schedule.shape[0]):
+                    total += schedule[i, t] * weights[i, k]
+                if total > peak or np.isnan(total):
+                    peak = total
+                    if np.isnan(peak):
+                        break
+            out[k] = peak
+else:
+    _energy_kernel = None
+    _tier_kernel = None
+
+
+class EnergyArrays(NamedTuple):
+    """Per-appliance (N, 12) energy and power matrices, row-aligned with the appliance names"""
+    appliances: np.ndarray
+    energy: np.ndarray
+    avg_power: np.ndarray
 
 
 class EnergyCalculator:
     """Handles energy and power calculations"""
     
-    def __init__(self, time_periods: List[str]):
-        self.time_periods = time_periods
+    def __init__(self, time_periods: Sequence[str]):
+        self.time_periods = list(time_periods)
     
     def compute_energy(self, row: pd.Series) -> pd.Series:
-        """Calculate energy (Wh) per 2-hour interval using Use Time %"""
+        """Calculate energy (Wh) per 2-hour interval using Use Time %
+
+        Deprecated: use compute_energy_batch on whole columns instead.
+        """
+        warnings.warn("compute_energy is deprecated; use compute_energy_batch", DeprecationWarning, stacklevel=2)
         duty = row["Duty Cycle (%)"] / 100
         use_time = row["Use Time (%)"] / 100
         power = row["Power (W)"]
@@ -22,8 +71,53 @@ class EnergyCalculator:
             result.append(interval_energy)
         return pd.Series(result, index=self.time_periods)
     
+    def schedule_matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Extract the (N, 12) on/off time-slot matrix as contiguous int8"""
+        return np.ascontiguousarray(df[self.time_periods].to_numpy(dtype=np.int8))
+    
+    @staticmethod
+    def compute_energy_batch(schedule: np.ndarray, quantity: np.ndarray, power: np.ndarray,
+                             duty: np.ndarray, use_time: np.ndarray) -> np.ndarray:
+        """Calculate the (N, 12) energy matrix (Wh) from raw arrays, using the numba kernel when available"""
+        quantity, power, duty, use_time = (np.asarray(a, dtype=np.float32) for a in (quantity, power, duty, use_time))
+        if _energy_kernel is None:
+            scale = 2 * quantity * power * duty * use_time * np.float32(1e-4)
+            return schedule * scale[:, None]
+        out = np.empty(schedule.shape, dtype=np.float32)
+        _energy_kernel(quantity, power, duty, use_time, np.ascontiguousarray(schedule), out)
+        return out
+    
+    @staticmethod
+    def compute_average_power_batch(schedule: np.ndarray, quantity: np.ndarray, power: np.ndarray) -> np.ndarray:
+        """Calculate the (N, 12) average power matrix (W) from raw arrays"""
+        scale = np.asarray(quantity, dtype=np.float32) * np.asarray(power, dtype=np.float32)
+        return schedule * scale[:, None]
+    
+    @staticmethod
+    def compute_instantaneous_power_batch(schedule: np.ndarray, quantity: np.ndarray, power: np.ndarray) -> np.ndarray:
+        """Calculate the (N, 12) instantaneous power matrix (W) from raw arrays"""
+        return EnergyCalculator.compute_average_power_batch(schedule, quantity, power)  # Same as average for now
+    
     def compute_average_power(self, row: pd.Series) -> pd.Series:
-        """Calculate average power per interval"""
+        """Calculate average power per interval
+
+        Deprecated: use compute_average_power_batch on whole columns instead.
+        """
+        warnings.warn("compute_average_power is deprecated; use compute_average_power_batch",
+                      DeprecationWarning, stacklevel=2)
+        return self._row_power(row)
+    
+    def compute_instantaneous_power(self, row: pd.Series) -> pd.Series:
+        """Calculate instantaneous power per interval
+
+        Deprecated: use compute_instantaneous_power_batch on whole columns instead.
+        """
+        warnings.warn("compute_instantaneous_power is deprecated; use compute_instantaneous_power_batch",
+                      DeprecationWarning, stacklevel=2)
+        return self._row_power(row)  # Same as average for now
+    
+    def _row_power(self, row: pd.Series) -> pd.Series:
+        """Power drawn by one appliance row in each interval"""
         qty = row["Quantity"]
         power = row["Power (W)"]
         result = []
@@ -33,16 +127,28 @@ class EnergyCalculator:
             result.append(interval_power)
         return pd.Series(result, index=self.time_periods)
     
-    def compute_instantaneous_power(self, row: pd.Series) -> pd.Series:
-        """Calculate instantaneous power per interval"""
-        return self.compute_average_power(row)  # Same as average for now
-    
-    def calculate_peak_loads(self, df: pd.DataFrame) -> Tuple[float, float]:
-        """Calculate peak real and apparent power loads"""
-        peak_load_real = (df[self.time_periods].astype(int).values *
-                         (df["Quantity"] * df["Power (W)"]).values.reshape(-1, 1)).sum(axis=0).max()
-
-        peak_load_apparent = (df[self.time_periods].astype(int).values *
-                             (df["Quantity"] * df["Apparent Power (VA)"]).values.reshape(-1, 1)).sum(axis=0).max()
-        
-        return peak_load_real, peak_load_apparent
\ No newline at end of file
+    @staticmethod
+    def compute_tier_peaks(schedule: np.ndarray, quantity: np.ndarray, power: np.ndarray, apparent: np.ndarray,
+                           use_time: np.ndarray, priority: np.ndarray) -> Dict[str, Tuple[float, float]]:
+        """Peak (real, apparent) load for all appliances, essential + medium, and essential only
+
+        `priority` holds PRIORITY_LEVELS codes. The all-appliance tier counts full rated power; the
+        priority tiers weight it by Use Time %. All six peaks come from one pass of the numba kernel
+        (or a single matmul without numba).
+        """
+        quantity, power, apparent, use_time = (np.asarray(a, dtype=np.float32)
+                                               for a in (quantity, power, apparent, use_time))
+        qty_power = quantity * power
+        qty_apparent = quantity * apparent
+        use_fraction = use_time / np.float32(100)
+        ess_med = ((priority == 0) | (priority == 1)) * use_fraction
+        ess = (priority == 0) * use_fraction
+        weights = np.column_stack([qty_power, qty_apparent,
+                                   qty_power * ess_med, qty_apparent * ess_med,
+                                   qty_power * ess, qty_apparent * ess])
+        if _tier_kernel is None:
+            peaks = (np.asarray(schedule, dtype=np.float32).T @ weights).max(axis=0, initial=0)
+        else:
+            peaks = np.empty(weights.shape[1], dtype=np.float32)
+            _tier_kernel(np.ascontiguousarray(schedule), np.ascontiguousarray(weights, dtype=np.float32), peaks)
+        return {tier: (float(peaks[2 * k]), float(peaks[2 * k + 1])) for k, tier in enumerate(("all", "ess_med", "ess"))}
@@ -1,13 +1,91 @@
 # load_profile_app.py - Main Application File
+import re
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
-from typing import Tuple
+from typing import Any, Dict, Tuple
 
-from database_manager import DatabaseManager
+from database_manager import PRIORITY_LEVELS, DatabaseManager, priority_codes
 from data_validator import DataValidator
-from energy_calculator import EnergyCalculator
-from chart_generator import ChartGenerator
+from energy_calculator import EnergyArrays, EnergyCalculator
+from chart_generator import ChartGenerator, frame_digest
+
+# Columns the cached calculations read; the digest of these keys the cache
+COMPUTE_COLUMNS = ("Appliance", "Quantity", "Power (W)", "Duty Cycle (%)", "Use Time (%)",
+                   "Apparent Power (VA)", "Priority")
+
+# Heating appliances left out of the essential + medium comparison profile
+HEATING_PATTERN = re.compile(r"geyser|stove", re.IGNORECASE)
+
+# Row labels of the comparison profiles stacked by _compute_all
+COMPARISON_PROFILES = ("All Appliances (Off-Grid)", "Essential + Medium (No Heating)", "Essentials Only")
+
+PRIORITY_COLORS = {"essential": "#FF6B6B", "medium": "#FFD93D", "non-essential": "#45B7D1"}
+
+
+@st.cache_resource
+def _compute_pool() -> ThreadPoolExecutor:
+    """Worker threads shared across reruns and sessions for the energy pass"""
+    return ThreadPoolExecutor(max_workers=3, thread_name_prefix="load-profile")
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _compute_all(key: str, time_periods: Tuple[str, ...], _df: pd.DataFrame,
+                 _heating: np.ndarray) -> Dict[str, Any]:
+    """Run the energy, peak-load and comparison-profile calculations; `key` is the digest of `_df`"""
+    calculator = EnergyCalculator(time_periods)
+    schedule = calculator.schedule_matrix(_df)
+    quantity = _df["Quantity"].to_numpy(dtype=np.float32)
+    power = _df["Power (W)"].to_numpy(dtype=np.float32)
+    use_time = _df["Use Time (%)"].to_numpy()
+
+    # The numba kernel releases the GIL, so the energy pass overlaps with the power and tier-peak passes below
+    energy = _compute_pool().submit(calculator.compute_energy_batch, schedule, quantity, power,
+                                    _df["Duty Cycle (%)"].to_numpy(), use_time)
+    # Instantaneous power equals average power per interval, so this matrix serves both
+    average_power = calculator.compute_average_power_batch(schedule, quantity, power)
+
+    codes = priority_codes(_df["Priority"])
+    tier_peaks = calculator.compute_tier_peaks(schedule, quantity, power, _df["Apparent Power (VA)"].to_numpy(),
+                                               use_time, codes)
+
+    ess_med = (codes >= 0) & (codes <= 1) & ~_heating
+    ess = codes == 0
+    profiles = np.vstack([  # rows follow COMPARISON_PROFILES
+        average_power.sum(axis=0),
+        average_power[ess_med].sum(axis=0),
+        average_power[ess].sum(axis=0),
+    ])
+
+    return {
+        "energy": energy.result(),
+        "average_power": average_power,
+        "tier_peaks": tier_peaks,
+        "priority_codes": codes,
+        "profiles": profiles,
+    }
+
+
+# Frame reshaping for the chart builders; the figures themselves are cached inside ChartGenerator
+def _power_chart(charts: ChartGenerator, arrays: EnergyArrays) -> go.Figure:
+    """Total load over time chart"""
+    plot_df = pd.DataFrame(arrays.avg_power.T, index=charts.time_periods, columns=arrays.appliances)
+    plot_df["Total Load (W)"] = arrays.avg_power.sum(axis=0)
+    return charts.create_power_consumption_chart(plot_df)
+
+
+def _stacked_energy_chart(charts: ChartGenerator, arrays: EnergyArrays, priority: np.ndarray) -> go.Figure:
+    """Energy by priority stacked bar chart"""
+    energy_df = pd.DataFrame(arrays.energy, columns=charts.time_periods).assign(Priority=priority)
+    return charts.create_stacked_energy_chart(energy_df)
+
+
+def _time_series_chart(charts: ChartGenerator, arrays: EnergyArrays, title: str) -> go.Figure:
+    """Per-appliance power time series chart"""
+    power_df = pd.DataFrame(arrays.avg_power, columns=charts.time_periods).assign(Appliance=arrays.appliances)
+    return charts.create_time_series_chart(power_df, title)
 
 
 class LoadProfileApp:
@@ -15,11 +93,38 @@ class LoadProfileApp:
     
     def __init__(self):
         self.db_manager = DatabaseManager()
+        self.time_periods = list(self.db_manager.time_periods)
+        self.compute_columns = list(COMPUTE_COLUMNS)
+        self._editor_column_order, self._editor_column_config = self._build_editor_layout()
         self.data_validator = DataValidator()
-        self.energy_calculator = EnergyCalculator(self.db_manager.time_periods)
-        self.chart_generator = ChartGenerator(self.db_manager.time_periods)
+        self.energy_calculator = EnergyCalculator(self.time_periods)
+        self.chart_generator = ChartGenerator(self.time_periods)
         self._initialize_app()
     
+    def _build_editor_layout(self) -> Tuple[Tuple[str, ...], Dict[str, Any]]:
+        """Column order (time slots kept together) and column config for the data editor"""
+        column_order = (
+            ("Appliance", "Quantity", "Power (W)", "Duty Cycle (%)", "Power Factor", "Use Time (%)")
+            + tuple(self.time_periods)
+            + ("Priority", "Room", "Apparent Power (VA)", "Total Daily Energy (Wh)", "id")
+        )
+        column_config = {
+            "Power (W)": st.column_config.NumberColumn(min_value=0),
+            "Quantity": st.column_config.NumberColumn(min_value=0),
+            "Power Factor": st.column_config.NumberColumn(min_value=0.01, max_value=1.0),
+            "Duty Cycle (%)": st.column_config.NumberColumn(min_value=0, max_value=100),
+            "Use Time (%)": st.column_config.NumberColumn(
+                min_value=0, max_value=100,
+                help="Percentage of time appliance is ON during each 2-hour period when selected"
+            ),
+            "Apparent Power (VA)": st.column_config.NumberColumn(format="%.1f"),
+            # Row identity for save_data's diff; a retyped id would turn an edit into a delete plus insert
+            "id": st.column_config.NumberColumn(disabled=True),
+        }
+        for t in self.time_periods:
+            column_config[t] = st.column_config.CheckboxColumn(default=False)
+        return column_order, column_config
+    
     def _initialize_app(self) -> None:
         """Initialize the application"""
         # Initialize database
@@ -49,83 +154,88 @@ class LoadProfileApp:
             st.error("No data available. Please check database connection.")
             st.stop()
         
-        # Store original data for change detection
-        if 'original_df' not in st.session_state:
-            st.session_state.original_df = df.copy()
+        # Snapshot the saved table for change detection
+        if 'original_snapshot' not in st.session_state:
+            st.session_state.original_snapshot = self.db_manager.snapshot(df)
         
         # Data editing interface
         edited_df = self._create_data_editor(df)
         
         # Validate and process edited data
-        edited_df = self.data_validator.validate_df(edited_df)
-        edited_df["Apparent Power (VA)"] = (edited_df["Power (W)"] / edited_df["Power Factor"]).round(1)
+        edited_df = self.data_validator.validate_df(edited_df, self.time_periods)
+        # Kept unrounded for the peak calculations; the tables round it for display. Computed in float32
+        # like the stored column, since added editor rows upcast the inputs and would diff every row on save
+        edited_df["Apparent Power (VA)"] = (edited_df["Power (W)"].to_numpy(np.float32)
+                                            / edited_df["Power Factor"].to_numpy(np.float32))
         
-        # Calculate energy and power data
-        energy_df, average_power_df, instantaneous_power_df = self._calculate_energy_and_power(edited_df)
+        # Calculate energy and power data; reruns with unchanged data are served from the cache
+        # Positional selector for the digest's columns, resolved once per rerun
+        key_columns = self.compute_columns + self.time_periods
+        key_iloc = edited_df.columns.get_indexer(key_columns)
+        if (key_iloc < 0).any():  # -1 would otherwise silently select the last column
+            raise KeyError([col for col, pos in zip(key_columns, key_iloc) if pos < 0])
+        data_key = frame_digest(edited_df.iloc[:, key_iloc])
+        results = _compute_all(data_key, tuple(self.time_periods), edited_df,
+                               self._heating_mask(edited_df["Appliance"]))
+        arrays = self._calculate_energy_and_power(edited_df, results)
         
         # Calculate total daily energy
-        edited_df["Total Daily Energy (Wh)"] = energy_df[self.db_manager.time_periods].sum(axis=1)
-        total_energy = edited_df["Total Daily Energy (Wh)"].sum()
+        # Stored as float32, matching the loaded column so unchanged rows don't diff on save
+        daily_energy = arrays.energy.sum(axis=1, dtype=np.float32)
+        edited_df["Total Daily Energy (Wh)"] = daily_energy
+        total_energy = daily_energy.sum()
         
         # Save changes button
         if st.button("Save Changes"):
-            if self.db_manager.save_data(edited_df, st.session_state.original_df):
-                st.session_state.original_df = edited_df.copy()
-                st.success("Changes saved to database!")
+            if self.db_manager.save_data(edited_df, st.session_state.original_snapshot):
+                # The rerun reloads the table (new rows pick up their database ids), snapshots it afresh,
+                # and resets the editor onto it; an empty reload stops before snapshotting
+                del st.session_state["original_snapshot"]
+                del st.session_state["editor"]
+                st.session_state.changes_saved = True
+                st.rerun()
             else:
                 st.error("Failed to save changes!")
+        if st.session_state.pop("changes_saved", False):
+            st.success("Changes saved to database!")
         
         # Display results
         self._display_appliance_table(edited_df)
-        self._display_charts(edited_df, energy_df, average_power_df, total_energy)
-        self._display_summaries(edited_df, energy_df, total_energy)
-        self._display_comparison_charts(edited_df)
+        self._display_charts(edited_df, arrays, data_key)
+        # Row positions per priority level, shared by the summaries
+        idx = {level: np.flatnonzero(results["priority_codes"] == code) for code, level in enumerate(PRIORITY_LEVELS)}
+        self._display_summaries(edited_df, arrays.energy, total_energy, results["tier_peaks"], idx)
+        self._display_comparison_charts(results["profiles"])
+    
+    def _heating_mask(self, names: pd.Series) -> np.ndarray:
+        """Flag heating appliances, recomputing only when the appliance names change"""
+        names_key = tuple(names)
+        if st.session_state.get("names_key") != names_key:
+            # Match each distinct name once, then broadcast through the category codes (-1 marks a missing name)
+            names_cat = pd.Categorical(names)
+            is_heating = np.append(np.asarray(names_cat.categories.str.contains(HEATING_PATTERN), dtype=bool), False)
+            st.session_state["is_heating"] = is_heating[names_cat.codes]
+            st.session_state["names_key"] = names_key
+        return st.session_state["is_heating"]
     
     def _create_data_editor(self, df: pd.DataFrame) -> pd.DataFrame:
         """Create the data editor interface with time columns grouped together"""
-        column_config = {
-            "Power (W)": st.column_config.NumberColumn(min_value=0),
-            "Quantity": st.column_config.NumberColumn(min_value=0),
-            "Power Factor": st.column_config.NumberColumn(min_value=0.01, max_value=1.0),
-            "Duty Cycle (%)": st.column_config.NumberColumn(min_value=0, max_value=100),
-            "Use Time (%)": st.column_config.NumberColumn(
-                min_value=0, max_value=100,
-                help="Percentage of time appliance is ON during each 2-hour period when selected"
-            ),
-        }
-        for t in self.db_manager.time_periods:
-            column_config[t] = st.column_config.CheckboxColumn()
-
-    # --- Force the editor to keep all 2h time slots together ---
-        desired_order = (
-            ["Appliance", "Quantity", "Power (W)", "Duty Cycle (%)", "Power Factor", "Use Time (%)"]
-            + self.db_manager.time_periods
-            + ["Priority", "Room", "Apparent Power (VA)", "Total Daily Energy (Wh)"]
-     )
-    # Keep any unexpected/existing columns safely at the end
-        ordered = [c for c in desired_order if c in df.columns] + [c for c in df.columns if c not in desired_order]
-        df = df.reindex(columns=ordered)
-    # -----------------------------------------------------------
+        column_order = self._editor_column_order
+        # Keep any unexpected/existing columns visible at the end
+        if not df.columns.isin(column_order).all():
+            column_order += tuple(c for c in df.columns if c not in column_order)
 
         return st.data_editor(
             df,
             use_container_width=True,
             num_rows="dynamic",
             key="editor",
-            column_config=column_config
+            column_order=column_order,
+            column_config=self._editor_column_config
     )
-    def _calculate_energy_and_power(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-        """Calculate energy and power dataframes"""
-        energy_df = df.apply(self.energy_calculator.compute_energy, axis=1)
-        energy_df["Appliance"] = df["Appliance"]
-
-        average_power_df = df.apply(self.energy_calculator.compute_average_power, axis=1)
-        average_power_df["Appliance"] = df["Appliance"]
-
-        instantaneous_power_df = df.apply(self.energy_calculator.compute_instantaneous_power, axis=1)
-        instantaneous_power_df["Appliance"] = df["Appliance"]
-
-        return energy_df, average_power_df, instantaneous_power_df
+    def _calculate_energy_and_power(self, df: pd.DataFrame, results: Dict[str, Any]) -> EnergyArrays:
+        """Bundle the computed energy and power matrices with the appliance names"""
+        return EnergyArrays(df["Appliance"].to_numpy(), results["energy"], results["average_power"])
     
     def _display_appliance_table(self, df: pd.DataFrame) -> None:
         """Display the appliance table"""
@@ -135,46 +245,48 @@ class LoadProfileApp:
             "Power Factor", "Apparent Power (VA)", "Total Daily Energy (Wh)", 
             "Priority", "Room"
         ]
-        st.dataframe(df[display_columns], use_container_width=True)
+        st.dataframe(df[display_columns], use_container_width=True, column_config={
+            "Apparent Power (VA)": st.column_config.NumberColumn(format="%.1f"),
+        })
     
-    def _display_charts(self, df: pd.DataFrame, energy_df: pd.DataFrame, 
-                       average_power_df: pd.DataFrame, total_energy: float) -> None:
+    def _display_charts(self, df: pd.DataFrame, arrays: EnergyArrays, data_key: str) -> None:
         """Display main charts"""
-        # Power consumption over time
-        st.markdown("### 🔌 Power Consumption Over Time")
-        plot_df = average_power_df.set_index("Appliance")[self.db_manager.time_periods].T
-        plot_df["Total Load (W)"] = plot_df.sum(axis=1)
-        
-        power_chart = self.chart_generator.create_power_consumption_chart(plot_df)
-        st.plotly_chart(power_chart, use_container_width=True)
-        
-        # Optional stacked bar chart for energy
-        if st.checkbox("Show stacked bar by appliance (Energy)"):
-            stacked_chart = self.chart_generator.create_stacked_energy_chart(energy_df)
-            st.plotly_chart(stacked_chart, use_container_width=True)
-        
-        # Individual appliance bar chart
-        st.markdown("### 📊 Individual Appliance Daily Energy Consumption (Bar Chart)")
+        # Sections track their open state and rerun on toggle, so collapsed charts are never built
+        with st.expander("🔌 Power Consumption Over Time", expanded=True, key="power_section",
+                         on_change="rerun") as section:
+            if section.open:
+                st.plotly_chart(_power_chart(self.chart_generator, arrays),
+                                use_container_width=True)
+                
+                # Optional stacked bar chart for energy
+                if st.checkbox("Show stacked bar by priority (Energy)"):
+                    stacked_chart = _stacked_energy_chart(self.chart_generator, arrays,
+                                                          df["Priority"].to_numpy())
+                    st.plotly_chart(stacked_chart, use_container_width=True)
         
         # Check for zero-energy appliances
         zero_energy_appliances = df.loc[df["Total Daily Energy (Wh)"] == 0, "Appliance"].tolist()
         if zero_energy_appliances:
             st.warning(f"Appliances with zero energy consumption: {', '.join(zero_energy_appliances)}")
         
-        daily_energy_chart = self.chart_generator.create_daily_energy_bar_chart(df)
-        if daily_energy_chart:
-            st.plotly_chart(daily_energy_chart, use_container_width=True)
+        # Individual appliance bar chart
+        with st.expander("📊 Individual Appliance Daily Energy Consumption (Bar Chart)", expanded=True,
+                         key="daily_energy_section", on_change="rerun") as section:
+            if section.open:
+                daily_energy_chart = self.chart_generator.create_daily_energy_bar_chart(df)
+                if daily_energy_chart:
+                    st.plotly_chart(daily_energy_chart, use_container_width=True)
         
         # Time series charts
-        self._display_time_series_charts(df, average_power_df)
+        self._display_time_series_charts(df, arrays, data_key)
     
-    def _display_time_series_charts(self, df: pd.DataFrame, average_power_df: pd.DataFrame) -> None:
+    def _display_time_series_charts(self, df: pd.DataFrame, arrays: EnergyArrays, data_key: str) -> None:
         """Display time series charts with filtering options"""
         # Main time series chart
         st.markdown("### 📈 Individual Appliance Power Consumption Time Series")
         
-        timeseries_chart = self.chart_generator.create_time_series_chart(
-            average_power_df, 
+        timeseries_chart = _time_series_chart(
+            self.chart_generator, arrays,
             "Power Consumption Time Series - All Appliances (Including Use Time %)"
         )
         st.plotly_chart(timeseries_chart, use_container_width=True)
@@ -198,37 +310,40 @@ class LoadProfileApp:
             if show_non_essential:
                 priorities_to_show.append("non-essential")
             
-            filtered_df = df[df["Priority"].isin(priorities_to_show)]
-            filtered_power_df = filtered_df.apply(self.energy_calculator.compute_average_power, axis=1)
-            filtered_power_df["Appliance"] = filtered_df["Appliance"]
-            
-            # Create filtered chart with priority-based coloring
-            fig_filtered = self._create_filtered_time_series_chart(filtered_df, filtered_power_df)
+            # Build the chart for every appliance once per data change; filter toggles only flip trace visibility
+            cached = st.session_state.get("filtered_ts_fig")
+            if cached is None or cached[0] != data_key:
+                cached = (data_key, self._create_filtered_time_series_chart(df, arrays))
+                st.session_state["filtered_ts_fig"] = cached
+            fig_filtered = cached[1]
+            for trace in fig_filtered.data:
+                trace.visible = trace.meta in priorities_to_show
             st.plotly_chart(fig_filtered, use_container_width=True)
     
-    def _create_filtered_time_series_chart(self, filtered_df: pd.DataFrame, 
-                                          filtered_power_df: pd.DataFrame) -> go.Figure:
+    def _create_filtered_time_series_chart(self, filtered_df: pd.DataFrame, arrays: EnergyArrays) -> go.Figure:
         """Create filtered time series chart with priority-based colors"""
         fig_filtered = go.Figure()
 
-        for i, appliance in enumerate(filtered_power_df["Appliance"]):
-            appliance_data = filtered_power_df[filtered_power_df["Appliance"] == appliance][self.db_manager.time_periods].values[0]
-            priority = filtered_df[filtered_df["Appliance"] == appliance]["Priority"].values[0]
-            if max(appliance_data) > 0:
-                color = '#FF6B6B' if priority == 'essential' else '#FFD93D' if priority == 'medium' else '#45B7D1'
-                fig_filtered.add_trace(go.Scatter(
-                    x=self.db_manager.time_periods,
-                    y=appliance_data,
-                    mode='lines+markers',
-                    name=f'{appliance} ({priority})',
-                    line=dict(color=color, width=2),
-                    marker=dict(size=6),
-                    hovertemplate=f'<b>{appliance}</b><br>' +
-                                 f'Priority: {priority}<br>' +
-                                 'Time: %{x}<br>' +
-                                 'Avg Power: %{y:.1f} W<br>' +
-                                 '<extra></extra>'
-                ))
+        power_matrix = arrays.avg_power
+        nonzero_mask = power_matrix.max(axis=1) > 0
+        names = arrays.appliances[nonzero_mask]
+        priorities = filtered_df["Priority"].to_numpy()[nonzero_mask]
+
+        for appliance, priority, appliance_data in zip(names, priorities, power_matrix[nonzero_mask]):
+            fig_filtered.add_trace(go.Scattergl(
+                x=self.time_periods,
+                y=appliance_data,
+                mode='lines+markers',
+                name=f'{appliance} ({priority})',
+                meta=str(priority),
+                line=dict(color=PRIORITY_COLORS.get(priority, '#45B7D1'), width=2),
+                marker=dict(size=6),
+                hovertemplate=f'<b>{appliance}</b><br>' +
+                             f'Priority: {priority}<br>' +
+                             'Time: %{x}<br>' +
+                             'Avg Power: %{y:.1f} W<br>' +
+                             '<extra></extra>'
+            ))
 
         fig_filtered.update_layout(
             title="Filtered Power Consumption Time Series (Including Use Time %)",
@@ -243,9 +358,10 @@ class LoadProfileApp:
         fig_filtered.update_yaxes(showgrid=False)
         return fig_filtered
     
-    def _display_summaries(self, df: pd.DataFrame, energy_df: pd.DataFrame, total_energy: float) -> None:
+    def _display_summaries(self, df: pd.DataFrame, energy: np.ndarray, total_energy: float,
+                           tier_peaks: Dict[str, Tuple[float, float]], idx: Dict[str, np.ndarray]) -> None:
         """Display load summaries by category"""
-        peak_load_real, peak_load_apparent = self.energy_calculator.calculate_peak_loads(df)
+        peak_load_real, peak_load_apparent = tier_peaks["all"]
         
         # 1. All Appliances Summary (OFF-GRID)
         st.markdown("### 1. 🟢 All Appliances (OFF-GRID)")
@@ -257,24 +373,20 @@ class LoadProfileApp:
         col5.metric("Number of Appliances", len(df), "")
 
         # 2. Essential + Medium Priority Appliances Summary
-        self._display_essential_medium_summary(df, energy_df, peak_load_apparent)
+        essential_medium_positions = np.sort(np.concatenate([idx["essential"], idx["medium"]]))
+        self._display_essential_medium_summary(energy, essential_medium_positions, tier_peaks["ess_med"],
+                                               peak_load_apparent)
         
         # 3. Essential Only Appliances Summary
-        self._display_essential_only_summary(df, energy_df, peak_load_apparent)
+        self._display_essential_only_summary(energy, idx["essential"], tier_peaks["ess"], peak_load_apparent)
     
-    def _display_essential_medium_summary(self, df: pd.DataFrame, energy_df: pd.DataFrame, 
-                                        peak_load_apparent: float) -> None:
-        """Display Essential + Medium priority summary"""
-        essential_medium_df = df[df["Priority"].str.lower().isin(["essential", "medium"])].copy()
-        if not essential_medium_df.empty:
-            essential_medium_energy_df = energy_df[energy_df["Appliance"].isin(essential_medium_df["Appliance"])]
-            essential_medium_total_energy = essential_medium_energy_df[self.db_manager.time_periods].sum().sum()
+    def _display_essential_medium_summary(self, energy: np.ndarray, positions: np.ndarray,
+                                        tier_peak: Tuple[float, float], peak_load_apparent: float) -> None:
+        """Display Essential + Medium priority summary for the appliance rows at `positions`"""
+        if len(positions):
+            essential_medium_total_energy = energy[positions].sum()
 
-            essential_medium_peak_load_real = (essential_medium_df[self.db_manager.time_periods].astype(int).values *
-                                              (essential_medium_df["Quantity"] * essential_medium_df["Power (W)"] * essential_medium_df["Use Time (%)"] / 100).values.reshape(-1, 1)).sum(axis=0).max()
-
-            essential_medium_peak_load_apparent = (essential_medium_df[self.db_manager.time_periods].astype(int).values *
-                                                  (essential_medium_df["Quantity"] * essential_medium_df["Apparent Power (VA)"] * essential_medium_df["Use Time (%)"] / 100).values.reshape(-1, 1)).sum(axis=0).max()
+            essential_medium_peak_load_real, essential_medium_peak_load_apparent = tier_peak
 
             essential_medium_load_allocation = (essential_medium_peak_load_apparent / peak_load_apparent * 100) if peak_load_apparent > 0 else 0
 
@@ -284,21 +396,15 @@ class LoadProfileApp:
             col2.metric("Essential+Medium Peak Real Power", f"{essential_medium_peak_load_real:.0f} W", f"{essential_medium_peak_load_real/1000:.2f} kW")
             col3.metric("Essential+Medium Peak Apparent Power", f"{essential_medium_peak_load_apparent:.0f} VA", f"{essential_medium_peak_load_apparent/1000:.2f} kVA")
             col4.metric("Load Percentage", f"{essential_medium_load_allocation:.1f}%", "of Total System")
-            col5.metric("Essential+Medium Count", len(essential_medium_df), "")
+            col5.metric("Essential+Medium Count", len(positions), "")
     
-    def _display_essential_only_summary(self, df: pd.DataFrame, energy_df: pd.DataFrame, 
-                                      peak_load_apparent: float) -> None:
-        """Display Essential only summary"""
-        essential_df = df[df["Priority"].str.lower() == "essential"].copy()
-        if not essential_df.empty:
-            essential_energy_df = energy_df[energy_df["Appliance"].isin(essential_df["Appliance"])]
-            essential_total_energy = essential_energy_df[self.db_manager.time_periods].sum().sum()
-
-            essential_peak_load_real = (essential_df[self.db_manager.time_periods].astype(int).values *
-                                       (essential_df["Quantity"] * essential_df["Power (W)"] * essential_df["Use Time (%)"] / 100).values.reshape(-1, 1)).sum(axis=0).max()
+    def _display_essential_only_summary(self, energy: np.ndarray, positions: np.ndarray,
+                                      tier_peak: Tuple[float, float], peak_load_apparent: float) -> None:
+        """Display Essential only summary for the appliance rows at `positions`"""
+        if len(positions):
+            essential_total_energy = energy[positions].sum()
 
-            essential_peak_load_apparent = (essential_df[self.db_manager.time_periods].astype(int).values *
-                                           (essential_df["Quantity"] * essential_df["Apparent Power (VA)"] * essential_df["Use Time (%)"] / 100).values.reshape(-1, 1)).sum(axis=0).max()
+            essential_peak_load_real, essential_peak_load_apparent = tier_peak
 
             essential_load_allocation = (essential_peak_load_apparent / peak_load_apparent * 100) if peak_load_apparent > 0 else 0
 
@@ -308,35 +414,15 @@ class LoadProfileApp:
             col2.metric("Essential Peak Real Power", f"{essential_peak_load_real:.0f} W", f"{essential_peak_load_real/1000:.2f} kW")
             col3.metric("Essential Peak Apparent Power", f"{essential_peak_load_apparent:.0f} VA", f"{essential_peak_load_apparent/1000:.2f} kVA")
             col4.metric("Load Percentage", f"{essential_load_allocation:.1f}%", "of Total System")
-            col5.metric("Essential Count", len(essential_df), "")
+            col5.metric("Essential Count", len(positions), "")
     
-    def _display_comparison_charts(self, df: pd.DataFrame) -> None:
+    def _display_comparison_charts(self, profiles: np.ndarray) -> None:
         """Display aggregated load profiles comparison"""
         st.markdown("### 🔄 Aggregated Load Profiles (Comparison)")
 
-        # 1. All appliances (off-grid)
-        average_power_df = df.apply(self.energy_calculator.compute_average_power, axis=1)
-        average_power_df["Appliance"] = df["Appliance"]
-        all_profile = average_power_df.set_index("Appliance")[self.db_manager.time_periods].sum()
-
-        # 2. Essential + Medium (excluding heating appliances)
-        ess_med_df = df[df["Priority"].str.lower().isin(["essential", "medium"])].copy()
-        ess_med_df = ess_med_df[~ess_med_df["Appliance"].str.contains("Geyser|Stove", case=False)]
-        ess_med_profile = (ess_med_df[self.db_manager.time_periods].astype(int).values *
-                          (ess_med_df["Quantity"] * ess_med_df["Power (W)"]).values.reshape(-1, 1)).sum(axis=0)
-
-        # 3. Essentials only
-        ess_df = df[df["Priority"].str.lower() == "essential"].copy()
-        ess_profile = (ess_df[self.db_manager.time_periods].astype(int).values *
-                      (ess_df["Quantity"] * ess_df["Power (W)"]).values.reshape(-1, 1)).sum(axis=0)
-
-        # Build comparison dataframe
-        comparison_df = pd.DataFrame({
-            "Time Period": self.db_manager.time_periods,
-            "All Appliances (Off-Grid)": all_profile.values,
-            "Essential + Medium (No Heating)": ess_med_profile,
-            "Essentials Only": ess_profile
-        })
+        # Build comparison dataframe from the stacked (3, 12) profiles in one allocation
+        comparison_df = pd.DataFrame(profiles.T, columns=COMPARISON_PROFILES)
+        comparison_df.insert(0, "Time Period", self.time_periods)
 
         # Create and display comparison chart
         comparison_chart = self.chart_generator.create_comparison_chart(comparison_df)